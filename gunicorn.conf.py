@@ -8,6 +8,18 @@ bind = f"{settings.host}:{settings.port}"
 workers = multiprocessing.cpu_count() * 2 + 1
 worker_class = "uvicorn.workers.UvicornWorker"
 
+# Replace workers before they accumulate too much state, see web/worker.py
+max_requests = settings.worker_max_requests
+max_requests_jitter = settings.worker_max_requests_jitter
+
 accesslog = "-"
 errorlog = "-"
 logconfig_dict = LOG_CONFIG
+
+
+def post_fork(server, worker):
+    """Let the worker recycle itself when it crosses the RSS watermark"""
+    # Imported here so the arbiter itself never sets up the database engine
+    from web.worker import enable_recycling
+
+    enable_recycling()
@@ -0,0 +1,38 @@
+import json
+import logging
+import os
+import tempfile
+
+import pytest
+
+# Keep tests away from the real database, must be set before web is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from web.app import app  # noqa: E402
+from web.logging import JSONFormatter  # noqa: E402
+from web.tracing import RequestIdFilter  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    """Test client with the app lifespan running"""
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def json_logs():
+    """Log lines formatted by JSONFormatter at the time they are emitted"""
+    lines = []
+
+    class Handler(logging.Handler):
+        def emit(self, record):
+            lines.append(json.loads(JSONFormatter().format(record)))
+
+    handler = Handler()
+    handler.addFilter(RequestIdFilter())
+    logging.getLogger().addHandler(handler)
+    yield lines
+    logging.getLogger().removeHandler(handler)
@@ -0,0 +1,204 @@
+import json
+import logging
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from web import tracing
+from web.app import app
+from web.auth import create_access_token
+from web.tracing import Trace, flush_traces, format_trace, span
+
+
+@pytest.fixture
+def trace():
+    """Run the test as if inside a sampled request"""
+    trace = Trace(request_id="test-request", sampled=True)
+    token = tracing._current_trace.set(trace)
+    yield trace
+    tracing._current_trace.reset(token)
+
+
+@pytest.fixture
+def engine():
+    """In-memory database engine with query spans"""
+    engine = create_engine("sqlite://")
+    tracing.instrument_engine(engine)
+    return engine
+
+
+@pytest.fixture
+def sampled(monkeypatch, tmp_path):
+    """Sample every request and export traces to a temporary file"""
+    monkeypatch.setattr(tracing.settings, "trace_sample_rate", 1.0)
+    monkeypatch.setattr(tracing.settings, "trace_export_path", tmp_path / "t.jsonl")
+    return tmp_path / "t.jsonl"
+
+
+def test_span_outside_request_does_nothing():
+    with span("outside") as s:
+        assert s is None
+
+
+def test_unsampled_trace_records_nothing(engine):
+    trace = Trace(request_id="test-request", sampled=False)
+    token = tracing._current_trace.set(trace)
+    try:
+        with span("outer") as s:
+            assert s is None
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+    finally:
+        tracing._current_trace.reset(token)
+    assert trace.spans == []
+
+
+def test_nested_spans(trace):
+    with span("outer") as outer:
+        with span("inner") as inner:
+            pass
+    assert inner.parent_span_id == outer.span_id
+    assert outer.parent_span_id is None
+    assert [s.name for s in trace.spans] == ["inner", "outer"]
+    assert outer.start_ns <= inner.start_ns <= inner.end_ns <= outer.end_ns
+
+
+def test_span_records_error(trace):
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError()
+    assert trace.spans[0].error
+    assert trace.spans[0].attributes["error.type"] == "ValueError"
+
+
+def test_query_span(trace, engine):
+    with span("outer") as outer:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    query = trace.spans[0]
+    assert query.name == "db.query"
+    assert query.attributes["db.statement"] == "SELECT 1"
+    assert query.parent_span_id == outer.span_id
+    assert not query.error
+
+
+def test_failed_query_span(trace, engine):
+    with span("outer") as outer:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            # The failed query must not be left as the current span
+            conn.execute(text("SELECT 1"))
+    failed, ok = trace.spans[0], trace.spans[1]
+    assert failed.error
+    assert failed.parent_span_id == outer.span_id
+    assert not ok.error
+    assert ok.parent_span_id == outer.span_id
+
+
+def test_format_trace_is_otlp_json(trace):
+    with span("outer", count=3):
+        with span("inner"):
+            pass
+    data = json.loads(format_trace(trace))
+    spans = data["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    inner, outer = spans
+    assert outer["traceId"] == trace.trace_id
+    assert "parentSpanId" not in outer
+    assert inner["parentSpanId"] == outer["spanId"]
+    assert outer["attributes"] == [{"key": "count", "value": {"intValue": "3"}}]
+    assert int(outer["endTimeUnixNano"]) >= int(outer["startTimeUnixNano"])
+
+
+def test_request_id_on_response(client):
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert re.fullmatch(r"[0-9a-f]{32}", response.headers["X-Request-ID"])
+
+
+def test_request_id_in_logs(client, json_logs):
+    client.get("/", follow_redirects=False)
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "nobody", "password": "wrong"},
+        headers={"X-CSRF-Token": client.cookies["csrf_token"]},
+    )
+    assert response.status_code == 401
+    warnings = [line for line in json_logs if line["level"] == "WARNING"]
+    assert warnings[0]["request_id"] == response.headers["X-Request-ID"]
+
+
+def test_incoming_request_id_is_kept(client):
+    response = client.get("/health", headers={"X-Request-ID": "client-id-1234"})
+    assert response.headers["X-Request-ID"] == "client-id-1234"
+
+
+def test_invalid_request_id_is_replaced(client):
+    response = client.get("/health", headers={"X-Request-ID": "bad id\n"})
+    assert re.fullmatch(r"[0-9a-f]{32}", response.headers["X-Request-ID"])
+
+
+def test_request_id_on_server_error():
+    token = create_access_token({"sub": "abc"})
+    with TestClient(app, raise_server_exceptions=False) as client:
+        response = client.get(
+            "/api/auth/me",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "X-Request-ID": "error-id-1234",
+            },
+        )
+    assert response.status_code == 500
+    assert response.headers["X-Request-ID"] == "error-id-1234"
+
+
+def test_request_id_on_server_error_log(client, json_logs):
+    token = create_access_token({"sub": "abc"})
+    with pytest.raises(ValueError) as error:
+        client.get(
+            "/api/auth/me",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "X-Request-ID": "error-id-1234",
+            },
+        )
+    # Like uvicorn, log the exception after the request has ended
+    logging.getLogger("uvicorn.error").error(
+        "Exception in ASGI application", exc_info=error.value
+    )
+    assert json_logs[-1]["request_id"] == "error-id-1234"
+
+
+def test_sampled_request_is_exported(client, sampled):
+    client.get("/health", headers={"X-Request-ID": "client-id-1234"})
+    client.get("/health", headers={"X-Request-ID": "client-id-1234"})
+    flush_traces()
+    traces = [json.loads(line) for line in sampled.read_text().splitlines()]
+    assert len(traces) == 2
+
+    trace_ids = set()
+    for data in traces:
+        spans = data["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root = next(s for s in spans if "parentSpanId" not in s)
+        assert root["name"] == "http.request"
+        assert {
+            "key": "http.request_id",
+            "value": {"stringValue": "client-id-1234"},
+        } in root["attributes"]
+        assert re.fullmatch(r"[0-9a-f]{32}", root["traceId"])
+        trace_ids.add(root["traceId"])
+
+    # A reused request id must not merge separate requests into one trace
+    assert len(trace_ids) == 2
+
+
+def test_csrf_span(client, sampled):
+    client.get("/", follow_redirects=False)
+    flush_traces()
+    data = json.loads(sampled.read_text())
+    spans = {s["name"]: s for s in data["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+    assert spans["http.csrf"]["parentSpanId"] == spans["http.request"]["spanId"]
+    assert spans["http.app"]["parentSpanId"] == spans["http.csrf"]["spanId"]
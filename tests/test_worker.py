@@ -0,0 +1,153 @@
+import asyncio
+import builtins
+import signal
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import SingletonThreadPool
+
+from web import worker
+from web.worker import (
+    check_worker,
+    current_rss_mb,
+    monitor_worker,
+    pick_rss_watermark,
+)
+
+
+class StopMonitor(BaseException):
+    """Raised by the fakes to end the monitor loop, which catches Exception"""
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    """Fresh worker stats with the monitor loop running without delays"""
+    stats = worker.WorkerStats()
+    monkeypatch.setattr(worker, "worker_stats", stats)
+    monkeypatch.setattr(worker.settings, "worker_max_rss_mb", 512)
+    monkeypatch.setattr(worker.settings, "worker_max_rss_jitter_mb", 0)
+    monkeypatch.setattr(worker.settings, "worker_check_interval", 0)
+    monkeypatch.setattr(worker.settings, "worker_log_interval", 0)
+    return stats
+
+
+def fake_rss(monkeypatch, *values):
+    """Make current_rss_mb() return the given values in turn, then stop"""
+    values = iter(values)
+
+    def rss():
+        value = next(values, None)
+        if value is None:
+            raise StopMonitor()
+        return value
+
+    monkeypatch.setattr(worker, "current_rss_mb", rss)
+
+
+def test_current_rss():
+    assert current_rss_mb() > 0
+
+
+def test_current_rss_without_procfs(monkeypatch):
+    def no_procfs(*args, **kwargs):
+        raise FileNotFoundError()
+
+    monkeypatch.setattr(builtins, "open", no_procfs)
+    assert current_rss_mb() is None
+
+
+def test_watermark_jitter(stats, monkeypatch):
+    monkeypatch.setattr(worker.settings, "worker_max_rss_jitter_mb", 64)
+    watermarks = {pick_rss_watermark() for _ in range(100)}
+    assert len(watermarks) > 1
+    assert all(512 <= w <= 512 + 64 for w in watermarks)
+
+
+def test_watermark_below_startup_rss(stats, monkeypatch, caplog):
+    monkeypatch.setattr(worker.settings, "worker_max_rss_mb", 1)
+    assert pick_rss_watermark() is None
+    assert "recycling disabled" in caplog.text
+
+
+def test_watermark_disabled(stats, monkeypatch):
+    monkeypatch.setattr(worker.settings, "worker_max_rss_mb", 0)
+    assert pick_rss_watermark() is None
+
+
+def test_monitor_recycles_over_watermark(stats, monkeypatch):
+    kills = []
+
+    def fake_kill(pid, sig):
+        kills.append(sig)
+        raise StopMonitor()
+
+    monkeypatch.setattr(worker, "recycling_enabled", True)
+    monkeypatch.setattr(worker.os, "kill", fake_kill)
+    fake_rss(monkeypatch, 100, 200, 600)
+
+    with pytest.raises(StopMonitor):
+        asyncio.run(monitor_worker())
+    assert kills == [signal.SIGTERM]
+    assert stats.rss_watermark_mb == 512
+    assert stats.over_watermark
+
+
+def test_check_without_gunicorn_does_not_recycle(stats, monkeypatch):
+    monkeypatch.setattr(worker.os, "kill", pytest.fail)
+    stats.rss_watermark_mb = 512
+    fake_rss(monkeypatch, 600)
+
+    check_worker()
+    assert stats.over_watermark
+
+
+def test_monitor_survives_failed_check(stats, monkeypatch, caplog):
+    calls = []
+
+    def failing_check():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("check failed")
+        raise StopMonitor()
+
+    monkeypatch.setattr(worker, "check_worker", failing_check)
+    with pytest.raises(StopMonitor):
+        asyncio.run(monitor_worker())
+    assert len(calls) == 2
+    assert "Worker resource check failed" in caplog.text
+
+
+def test_monitor_logs_stats(stats, monkeypatch, caplog):
+    checks = []
+
+    def check():
+        checks.append(None)
+        if len(checks) == 3:
+            raise StopMonitor()
+
+    clock = iter(range(0, 100, 10))
+    monkeypatch.setattr(worker.settings, "worker_log_interval", 15)
+    monkeypatch.setattr(worker, "time", SimpleNamespace(monotonic=lambda: next(clock)))
+    monkeypatch.setattr(worker, "check_worker", check)
+
+    with caplog.at_level("INFO", logger="web.worker"):
+        with pytest.raises(StopMonitor):
+            asyncio.run(monitor_worker())
+    # Checked at 10 and 20 seconds, only the second is past the log interval
+    assert caplog.text.count("Worker stats:") == 1
+
+
+def test_stats_without_connection_count(monkeypatch):
+    engine = create_engine("sqlite://")
+    assert isinstance(engine.pool, SingletonThreadPool)
+    monkeypatch.setattr(worker, "engine", engine)
+    assert worker.WorkerStats().snapshot()["db_connections_in_use"] is None
+
+
+def test_health_reports_worker_stats(client):
+    worker_stats = client.get("/health").json()["worker"]
+    assert worker_stats["requests"] >= 1
+    assert worker_stats["active_requests"] == 1
+    assert worker_stats["rss_mb"] > 0
+    assert worker_stats["db_connections_in_use"] == 0
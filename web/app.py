@@ -2,18 +2,22 @@
 
 import re
 import time
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.types import ASGIApp
 from starlette_csrf.middleware import CSRFMiddleware
 
 from . import __version__
 from .settings import settings
 from .database import init_db
 from .routes import auth, pages
+from .tracing import SpanMiddleware, TracingMiddleware, flush_traces
+from .worker import WorkerStatsMiddleware, monitor_worker, worker_stats
 
 logger = logging.getLogger(__name__)
 
@@ -26,17 +30,36 @@ async def lifespan(app: FastAPI):
     logger.info(f"Starting up worker for {settings.app_name} (version {__version__})")
     app.state.startup_time = time.time()
     init_db()
+    monitor = asyncio.create_task(monitor_worker())
 
     yield
 
     # Shutdown:
+    monitor.cancel()
+    with suppress(asyncio.CancelledError):
+        await monitor
+    flush_traces()
     logger.info(
-        f"Shutting down worker, uptime: {int(time.time() - app.state.startup_time)}s"
+        f"Shutting down worker, uptime: {int(time.time() - app.state.startup_time)}s, "
+        f"stats: {worker_stats.snapshot()}"
     )
 
 
+class TracedFastAPI(FastAPI):
+    """FastAPI app with request tracing around the whole middleware stack"""
+
+    def build_middleware_stack(self) -> ASGIApp:
+        # Middleware added with add_middleware() runs inside Starlette's error
+        # handling, so 500 responses from there would lose the request id
+        return TracingMiddleware(super().build_middleware_stack())
+
+
 # Initialize FastAPI app
-app = FastAPI(title=settings.app_name, version=__version__, lifespan=lifespan)
+app = TracedFastAPI(title=settings.app_name, version=__version__, lifespan=lifespan)
+
+# Time everything below the CSRF middleware, the gap to the "http.csrf" span
+# is the CSRF middleware's own cost
+app.add_middleware(SpanMiddleware, name="http.app")
 
 # Add CSRF protection middleware
 app.add_middleware(
@@ -48,6 +71,10 @@ app.add_middleware(
     header_name="X-CSRF-Token",
     exempt_urls=[re.compile(r"^/health$")],  # Exempt health check from CSRF
 )
+app.add_middleware(SpanMiddleware, name="http.csrf")
+
+# Count requests per worker
+app.add_middleware(WorkerStatsMiddleware)
 
 # Get the app directory path
 APP_DIR = Path(__file__).parent
@@ -69,4 +96,8 @@ app.include_router(pages.router)
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "OK", "uptime": int(time.time() - app.state.startup_time)}
+    return {
+        "status": "OK",
+        "uptime": int(time.time() - app.state.startup_time),
+        "worker": worker_stats.snapshot(),
+    }
@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 
 from .settings import settings
 from .database import User, get_db
+from .tracing import span, traced
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -22,6 +23,7 @@ def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 
+@traced("auth.verify_password")
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -43,6 +45,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+@traced("auth.verify_token")
 def verify_token(token: str) -> dict:
     """Verify and decode a JWT token"""
     try:
@@ -58,6 +61,7 @@ def verify_token(token: str) -> dict:
         )
 
 
+@traced("auth.authenticate_user")
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     """Authenticate a user by username and password"""
     user = db.query(User).filter(User.username == username).first()
@@ -99,7 +103,8 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    with span("auth.load_user"):
+        user = db.query(User).filter(User.id == int(user_id)).first()
     if user is None:
         raise credentials_exception
 
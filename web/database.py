@@ -6,6 +6,7 @@ from sqlalchemy import Boolean, Column, DateTime, Integer, String, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .settings import settings
+from .tracing import instrument_engine
 
 logger = logging.getLogger(__name__)
 Base = declarative_base()
@@ -27,6 +28,7 @@ class User(Base):
 
 # Database engine and session
 engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
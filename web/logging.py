@@ -5,6 +5,7 @@ import logging
 from datetime import datetime, timezone
 from typing import Any
 from .settings import settings
+from .tracing import RequestIdFilter
 
 
 class JSONFormatter(logging.Formatter):
@@ -17,6 +18,9 @@ class JSONFormatter(logging.Formatter):
             "logger": record.name,
             "message": record.getMessage(),
         }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            log_data["request_id"] = request_id
         if record.exc_info:
             log_data["exception"] = self.formatException(record.exc_info)
         return json.dumps(log_data, default=str)
@@ -34,10 +38,12 @@ LOG_CONFIG = {
         "json": {"()": JSONFormatter},
         "default": {"format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s"},
     },
+    "filters": {"request_id": {"()": RequestIdFilter}},
     "handlers": {
         "default": {
             "class": "logging.StreamHandler",
             "stream": "ext://sys.stdout",
+            "filters": ["request_id"],
             "formatter": settings.log_format
             if settings.log_format == "json"
             else "default",
@@ -4,6 +4,7 @@ from fastapi.templating import Jinja2Templates
 
 from ..auth import get_current_user
 from ..database import User
+from ..tracing import span
 
 router = APIRouter(tags=["pages"])
 
@@ -28,12 +29,14 @@ async def home(request: Request):
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Login page"""
-    return templates.TemplateResponse("login.html", {"request": request})
+    with span("template.render", template="login.html"):
+        return templates.TemplateResponse("login.html", {"request": request})
 
 
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(request: Request, current_user: User = Depends(get_current_user)):
     """Dashboard page - requires authentication"""
-    return templates.TemplateResponse(
-        "dashboard.html", {"request": request, "user": current_user}
-    )
+    with span("template.render", template="dashboard.html"):
+        return templates.TemplateResponse(
+            "dashboard.html", {"request": request, "user": current_user}
+        )
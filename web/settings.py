@@ -48,6 +48,46 @@ class Settings(BaseSettings):
         description="Server configs path",
     )
 
+    # Tracing Configuration
+    trace_sample_rate: float = Field(
+        default=0.0,
+        ge=0.0,
+        le=1.0,
+        description="Fraction of requests to record timed spans for (0.0 - 1.0)",
+    )
+    trace_export_path: Path = Field(
+        default=ROOT_PATH / "traces.jsonl",
+        description="File sampled traces are appended to (not rotated or capped)",
+    )
+
+    # Worker Recycling Configuration
+    worker_max_requests: int = Field(
+        default=1000,
+        ge=0,
+        description="Requests after which a gunicorn worker is replaced (0 = never)",
+    )
+    worker_max_requests_jitter: int = Field(
+        default=100,
+        ge=0,
+        description="Random extra requests, so workers aren't all replaced at once",
+    )
+    worker_max_rss_mb: int = Field(
+        default=512,
+        ge=0,
+        description="Worker RSS in MB after which it is replaced (0 = never)",
+    )
+    worker_max_rss_jitter_mb: int = Field(
+        default=64,
+        ge=0,
+        description="Random extra RSS in MB, so workers aren't all replaced at once",
+    )
+    worker_check_interval: int = Field(
+        default=15, gt=0, description="Seconds between worker resource checks"
+    )
+    worker_log_interval: int = Field(
+        default=300, ge=0, description="Seconds between worker stats logs (0 = never)"
+    )
+
     # Database Configuration
     database_url: str = Field(
         default=f"sqlite:///{ROOT_PATH / 'adhoc_users.db'}",
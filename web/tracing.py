@@ -0,0 +1,333 @@
+"""Lightweight request tracing
+
+Every request gets a request id that is attached to log lines by
+`RequestIdFilter` and returned in the ``X-Request-ID`` response header. A sampled fraction of requests
+additionally records timed spans. A background thread appends them to a file
+as OTLP/JSON lines, one ``ExportTraceServiceRequest`` per trace. The
+OpenTelemetry collector's ``otlpjsonfile`` receiver can read that format.
+"""
+
+import json
+import logging
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Accept client supplied ids only if they can't mess up logs or headers
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9-]{8,64}$")
+
+# OTLP span kinds and status codes
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+_STATUS_CODE_ERROR = 2
+
+# Traces waiting to be written, dropped when the writer can't keep up
+_export_queue: queue.Queue[str] = queue.Queue(maxsize=10000)
+_export_thread: Optional[threading.Thread] = None
+
+
+@dataclass
+class Span:
+    """A single timed operation within a trace"""
+
+    name: str
+    span_id: str
+    parent_span_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: bool = False
+
+
+@dataclass
+class Trace:
+    """All spans recorded while handling one request"""
+
+    request_id: str
+    sampled: bool
+    trace_id: str = field(default_factory=lambda: secrets.token_hex(16))
+    spans: list[Span] = field(default_factory=list)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    """Return the id of the request being handled, if any"""
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+class RequestIdFilter(logging.Filter):
+    """Logging filter that sets ``record.request_id``
+
+    Exceptions that escape a request carry its id, so that the server's own
+    traceback log line, emitted after the request has ended, gets it too.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = get_request_id()
+        if request_id is None and record.exc_info:
+            request_id = getattr(record.exc_info[1], "_request_id", None)
+        record.request_id = request_id
+        return True
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time the enclosed block as a child of the current span
+
+    Does nothing outside of a sampled request.
+    """
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        span_id=secrets.token_hex(8),
+        parent_span_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = True
+        current.attributes["error.type"] = type(e).__name__
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        trace.spans.append(current)
+        _current_span.reset(token)
+
+
+def traced(name: str) -> Callable:
+    """Decorator version of `span` for plain functions"""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    """Convert an attribute value to an OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(trace: Trace, s: Span) -> dict[str, Any]:
+    """Convert a span to an OTLP/JSON span"""
+    otlp = {
+        "traceId": trace.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": _SPAN_KIND_SERVER if s.parent_span_id is None else _SPAN_KIND_INTERNAL,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [
+            {"key": key, "value": _otlp_value(value)}
+            for key, value in s.attributes.items()
+        ],
+    }
+    if s.parent_span_id:
+        otlp["parentSpanId"] = s.parent_span_id
+    if s.error:
+        otlp["status"] = {"code": _STATUS_CODE_ERROR}
+    return otlp
+
+
+def format_trace(trace: Trace) -> str:
+    """Format a finished trace as a single OTLP/JSON line"""
+    return json.dumps(
+        {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": settings.app_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [_otlp_span(trace, s) for s in trace.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+    )
+
+
+def _write_exports() -> None:
+    """Append queued traces to the export file, in batches"""
+    while True:
+        lines = [_export_queue.get()]
+        while not _export_queue.empty():
+            lines.append(_export_queue.get_nowait())
+        try:
+            # Reopened for every batch, so rotating the file needs no signalling
+            with open(settings.trace_export_path, "a") as f:
+                f.write("".join(lines))
+        except OSError:
+            logger.exception(f"Could not export traces to {settings.trace_export_path}")
+        finally:
+            for _ in lines:
+                _export_queue.task_done()
+
+
+def export_trace(trace: Trace) -> None:
+    """Queue a finished trace for writing without blocking the event loop"""
+    global _export_thread
+    if _export_thread is None:
+        # Started lazily, so it runs in the gunicorn worker and not the arbiter
+        _export_thread = threading.Thread(
+            target=_write_exports, name="trace-export", daemon=True
+        )
+        _export_thread.start()
+    try:
+        _export_queue.put_nowait(format_trace(trace) + "\n")
+    except queue.Full:
+        logger.warning("Trace export queue is full, dropping trace")
+
+
+def flush_traces() -> None:
+    """Wait until all queued traces have been written"""
+    _export_queue.join()
+
+
+class TracingMiddleware:
+    """ASGI middleware that starts a trace for every HTTP request
+
+    Wrap the whole application with it, outside of Starlette's own error
+    handling, so that error responses get the request id too.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER, "")
+        if not _VALID_REQUEST_ID.match(request_id):
+            request_id = secrets.token_hex(16)
+
+        trace = Trace(
+            request_id=request_id,
+            sampled=random.random() < settings.trace_sample_rate,
+        )
+        token = _current_trace.set(trace)
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+                if root is not None:
+                    root.attributes["http.status_code"] = message["status"]
+            await send(message)
+
+        try:
+            with span(
+                "http.request",
+                **{
+                    "http.method": scope["method"],
+                    "http.path": scope["path"],
+                    "http.request_id": request_id,
+                },
+            ) as root:
+                await self.app(scope, receive, send_with_request_id)
+        except Exception as e:
+            # The server logs it after the request has ended, see RequestIdFilter
+            e._request_id = request_id
+            raise
+        finally:
+            _current_trace.reset(token)
+            if trace.sampled:
+                export_trace(trace)
+
+
+class SpanMiddleware:
+    """ASGI middleware that times everything below it as a single span"""
+
+    def __init__(self, app: ASGIApp, name: str):
+        self.app = app
+        self.name = name
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with span(self.name):
+            await self.app(scope, receive, send)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record a span for every SQL statement executed on the engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        if context is None:
+            return
+        # Kept on the execution context, which lives exactly as long as the
+        # statement, and closed again by one of the handlers below
+        context._query_span = span("db.query", **{"db.statement": statement})
+        context._query_span.__enter__()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        query_span = getattr(context, "_query_span", None)
+        if query_span is not None:
+            context._query_span = None
+            query_span.__exit__(None, None, None)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        query_span = getattr(context, "_query_span", None)
+        if query_span is not None:
+            context._query_span = None
+            error = exception_context.original_exception
+            query_span.__exit__(type(error), error, error.__traceback__)
@@ -0,0 +1,166 @@
+"""Per-worker resource accounting and memory-watermark recycling
+
+Each worker process tracks its RSS, request counts and database connections
+in use. When running under gunicorn, a worker that grows past the
+configured RSS watermark sends itself SIGTERM: uvicorn then stops accepting
+new connections, finishes in-flight requests and exits, and the gunicorn
+arbiter starts a fresh worker in its place. RSS is read from procfs, so
+recycling is disabled on systems without it.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import signal
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .database import engine
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WorkerStats:
+    """Resource usage counters of the current worker process"""
+
+    requests: int = 0
+    active_requests: int = 0
+    rss_watermark_mb: Optional[int] = None
+    over_watermark: bool = False
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return current counters and resource usage"""
+        return {
+            "pid": os.getpid(),
+            "rss_mb": current_rss_mb(),
+            "requests": self.requests,
+            "active_requests": self.active_requests,
+            "db_connections_in_use": db_connections_in_use(),
+            "rss_watermark_mb": self.rss_watermark_mb,
+            "over_watermark": self.over_watermark,
+        }
+
+
+worker_stats = WorkerStats()
+
+# Set by the gunicorn post_fork hook, so a bare uvicorn process never kills itself
+recycling_enabled = False
+
+
+def enable_recycling() -> None:
+    """Allow this worker to exit when it crosses the RSS watermark"""
+    global recycling_enabled
+    recycling_enabled = True
+
+
+def current_rss_mb() -> Optional[float]:
+    """Return the resident set size of this process in MB, if it can be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        # No procfs (e.g. macOS), and getrusage() only knows the peak RSS
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+
+
+def db_connections_in_use() -> Optional[int]:
+    """Return the number of pooled database connections checked out, if known"""
+    # Only QueuePool keeps count, not e.g. the pools used for in-memory SQLite
+    checkedout = getattr(engine.pool, "checkedout", None)
+    return checkedout() if checkedout else None
+
+
+def pick_rss_watermark() -> Optional[int]:
+    """Return this worker's RSS watermark in MB, or None to never recycle
+
+    Each worker adds its own random jitter, so that workers growing at the
+    same rate aren't all replaced at once.
+    """
+    if not settings.worker_max_rss_mb:
+        return None
+
+    startup_rss = current_rss_mb()
+    if startup_rss is None:
+        logger.warning("Can't read worker RSS, memory-watermark recycling disabled")
+        return None
+    if settings.worker_max_rss_mb <= startup_rss:
+        logger.error(
+            f"WORKER_MAX_RSS_MB={settings.worker_max_rss_mb} is not above the "
+            f"worker startup RSS of {startup_rss} MB, "
+            "memory-watermark recycling disabled"
+        )
+        return None
+
+    return settings.worker_max_rss_mb + random.randint(
+        0, settings.worker_max_rss_jitter_mb
+    )
+
+
+class WorkerStatsMiddleware:
+    """ASGI middleware that counts handled and in-flight requests"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        worker_stats.requests += 1
+        worker_stats.active_requests += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            worker_stats.active_requests -= 1
+
+
+def check_worker() -> None:
+    """Recycle the worker if it is over its RSS watermark"""
+    watermark = worker_stats.rss_watermark_mb
+    if watermark is None or worker_stats.over_watermark:
+        return
+    stats = worker_stats.snapshot()
+    if stats["rss_mb"] is None or stats["rss_mb"] < watermark:
+        return
+
+    worker_stats.over_watermark = True
+    if not recycling_enabled:
+        logger.warning(
+            f"Worker is over its {watermark} MB RSS watermark, "
+            f"but not running under gunicorn so not recycling: {stats}"
+        )
+        return
+
+    logger.warning(
+        f"Worker is over its {watermark} MB RSS watermark, recycling: {stats}"
+    )
+    # Same signal the arbiter uses for a graceful worker shutdown
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+async def monitor_worker() -> None:
+    """Periodically check and log the worker's resource usage"""
+    # Picked right after startup, so the startup RSS is the baseline
+    worker_stats.rss_watermark_mb = pick_rss_watermark()
+    last_logged = time.monotonic()
+    while True:
+        await asyncio.sleep(settings.worker_check_interval)
+        # A failed check must not end the loop, or recycling would silently stop
+        try:
+            check_worker()
+            if (
+                settings.worker_log_interval
+                and time.monotonic() - last_logged >= settings.worker_log_interval
+            ):
+                last_logged = time.monotonic()
+                logger.info(f"Worker stats: {worker_stats.snapshot()}")
+        except Exception:
+            logger.exception("Worker resource check failed")